@@ -2,9 +2,23 @@
 Grid World 环境配置参数
 """
 
+# 不可变常量，导入时构造一次，供所有环境实例共享
+# 禁止状态
+FORBIDDEN_STATES = ((1, 1), (2, 2), (3, 1))
+
+# 动作空间: (dx, dy) 元组形式
+ACTION_SPACE = (
+    (0, -1),   # up
+    (1, 0),    # right
+    (0, 1),    # down
+    (-1, 0),   # left
+    (0, 0)     # stay
+)
+
+
 class Arguments:
     def __init__(self):
-        # 环境尺寸 (rows, cols)
+        # 环境尺寸 (width, height): x 方向列数, y 方向行数
         self.env_size = (5, 5)
         
         # 起始状态 (0-indexed)
@@ -13,17 +27,11 @@ class Arguments:
         # 目标状态
         self.target_state = (4, 4)
         
-        # 禁止状态列表
-        self.forbidden_states = [(1, 1), (2, 2), (3, 1)]
+        # 禁止状态
+        self.forbidden_states = FORBIDDEN_STATES
         
         # 动作空间: (dx, dy) 元组形式
-        self.action_space = [
-            (0, -1),   # up
-            (1, 0),    # right
-            (0, 1),    # down
-            (-1, 0),   # left
-            (0, 0)     # stay
-        ]
+        self.action_space = ACTION_SPACE
         
         # 奖励设置
         self.reward_target = 1         # 到达目标的奖励
@@ -32,6 +40,7 @@ class Arguments:
         
         # 可视化设置
         self.animation_interval = 0.1  # 动画间隔（秒）
+        self.traj_max_segments = 1000  # 渲染时保留的最近轨迹线段数
         self.debug = False             # 是否开启调试模式
 
 # 创建全局配置实例
@@ -4,10 +4,15 @@
 Credits: Intelligent Unmanned Systems Laboratory at Westlake University.
 """
 
+from collections import deque
+
 import numpy as np
+import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches          
-from conf.arguments import args           
+from matplotlib.collections import LineCollection, PatchCollection
+from conf.arguments import args
+from gridworld_kernels import build_tables, step_kernel, GridWorldCore
 
 
 class GridWorld():
@@ -34,30 +39,72 @@ class GridWorld():
                  env_size=args.env_size, 
                  start_state=args.start_state, 
                  target_state=args.target_state, 
-                 forbidden_states=args.forbidden_states):
+                 forbidden_states=args.forbidden_states,
+                 record_traj=False,
+                 max_traj=10_000):
         """
         初始化 GridWorld 环境
         
         参数:
-            env_size: tuple (rows, cols) 环境大小
+            env_size: tuple (width, height) 环境大小，即 x 方向（列数）和 y 方向（行数）的格数
             start_state: tuple (x, y) 起始状态，0-indexed
             target_state: tuple (x, y) 目标状态
-            forbidden_states: list [(x, y), ...] 禁止状态列表
+            forbidden_states: 可迭代对象 [(x, y), ...] 禁止状态，内部存储为元组
+            record_traj: bool 是否记录轨迹（仅用于可视化），训练时保持关闭
+            max_traj: int 预分配的轨迹步数，超出后自动扩容
         """
         self.env_size = env_size
         self.num_states = env_size[0] * env_size[1]
+        self._max_x = env_size[0] - 1
+        self._max_y = env_size[1] - 1
+        self._check_in_grid(start_state, "start_state")
+        self._check_in_grid(target_state, "target_state")
         self.start_state = start_state
         self.target_state = target_state
-        self.forbidden_states = forbidden_states
+        self.forbidden_states = tuple(forbidden_states)
+        # 禁止区域掩码，按 [x, y] 索引，替代列表线性查找
+        self._forbidden_mask = np.zeros(env_size, dtype=bool)
+        for fx, fy in self.forbidden_states:
+            self._check_in_grid((fx, fy), "forbidden state")
+            self._forbidden_mask[fx, fy] = True
 
-        self.agent_state = start_state
-        self.action_space = args.action_space          
+        # 智能体状态以扁平编号存储: s = y * env_size[0] + x
+        self._cols = env_size[0]
+        self._agent_flat = start_state[1] * self._cols + start_state[0]
+        self._target_flat = target_state[1] * self._cols + target_state[0]
+        self.action_space = tuple(args.action_space)
+        self._action_index = {a: i for i, a in enumerate(self.action_space)}
+        self._action_set = frozenset(self.action_space)
         self.reward_target = args.reward_target
         self.reward_forbidden = args.reward_forbidden
         self.reward_step = args.reward_step
+        self.record_traj = record_traj
+        # 轨迹缓冲区：每步写入两行 (抖动点, 实际状态)，外加起点一行
+        self._traj_buf = np.empty((2 * max_traj + 1 if record_traj else 1, 2),
+                                  dtype=np.float32)
+        self._traj_len = 0
+
+        # 轨迹抖动噪声缓冲区，首次使用时按块填充
+        self._rng = np.random.default_rng()
+        self._noise_buf = np.empty(0)
+        self._noise_i = 0
+
+        # step_kernel 使用的标量常量
+        self._tx, self._ty = target_state
+        self._r_t = float(self.reward_target)
+        self._r_f = float(self.reward_forbidden)
+        self._r_s = float(self.reward_step)
+
+        # 预计算转移表和奖励表：MDP 是静态的，step 只需查表
+        # 状态编号与 add_policy 一致: s = y * env_size[0] + x
+        self._build_transition_tables()
+        self._core = None  # jitclass 编译较慢，按需构造
 
         self.canvas = None
         self.animation_interval = args.animation_interval
+        # 渲染时只保留最近的轨迹线段，每帧绘制开销与回合长度无关
+        self._traj_segments = deque(maxlen=args.traj_max_segments)
+        self._traj_drawn = 0  # 已转换为线段的轨迹点数，0 表示需要刷新
 
         # 颜色配置
         self.color_forbid = (0.9290, 0.6940, 0.125)      # 黄色 - 禁止区域
@@ -75,7 +122,10 @@ class GridWorld():
             info: dict 额外信息（当前为空字典）
         """
         self.agent_state = self.start_state
-        self.traj = [self.agent_state] 
+        self._traj_buf[0] = self.agent_state
+        self._traj_len = 1
+        self._traj_segments.clear()
+        self._traj_drawn = 0
         return self.agent_state, {}
 
     def step(self, action):
@@ -92,77 +142,210 @@ class GridWorld():
             done: bool 是否到达终止状态
             info: dict 额外信息（当前为空字典）
         """
-        assert action in self.action_space, f"Invalid action {action}"
-
-        next_state, reward = self._get_next_state_and_reward(self.agent_state, action)
-        done = self._is_done(next_state)
-
-        # 添加轨迹记录（带随机偏移以显示路径）
-        x_store = next_state[0] + 0.03 * np.random.randn()
-        y_store = next_state[1] + 0.03 * np.random.randn()
-        state_store = tuple(np.array((x_store, y_store)) + 0.2 * np.array(action))
-        state_store_2 = (next_state[0], next_state[1])
+        assert action in self._action_set, f"Invalid action {action}"
 
-        self.agent_state = next_state
+        s_idx = self._agent_flat
+        a_idx = self._action_index[action]
+        self._agent_flat = next_flat = int(self._next[s_idx, a_idx])
+        reward = float(self._reward[s_idx, a_idx])
+        done = next_flat == self._target_flat
 
-        self.traj.append(state_store)   
-        self.traj.append(state_store_2)
+        if self.record_traj:
+            # 添加轨迹记录（带随机偏移以显示路径）
+            dx, dy = action
+            ny, nx = divmod(next_flat, self._cols)
+            noise_x, noise_y = self._rand2()
+            i = self._traj_len
+            if i + 2 > len(self._traj_buf):
+                # 至少容纳本步的两行；缓冲区可能只有 1 行（创建时未开启记录）
+                buf = np.empty((max(2 * len(self._traj_buf), i + 2), 2),
+                               dtype=np.float32)
+                buf[:i] = self._traj_buf[:i]
+                self._traj_buf = buf
+            buf = self._traj_buf
+            buf[i, 0] = nx + 0.03 * noise_x + 0.2 * dx
+            buf[i, 1] = ny + 0.03 * noise_y + 0.2 * dy
+            buf[i + 1, 0] = nx
+            buf[i + 1, 1] = ny
+            self._traj_len = i + 2
         return self.agent_state, reward, done, {}   
     
-    def _get_next_state_and_reward(self, state, action):
+    @property
+    def agent_state(self):
         """
-        计算下一个状态和奖励（内部方法）
+        智能体当前状态
+
+        返回:
+            tuple (x, y) 由扁平编号解码得到
+        """
+        y, x = divmod(self._agent_flat, self._cols)
+        return (x, y)
+
+    @agent_state.setter
+    def agent_state(self, state):
+        self._check_in_grid(state, "agent_state")
+        self._agent_flat = int(state[1]) * self._cols + int(state[0])
+
+    def _check_in_grid(self, state, name):
+        """
+        检查状态坐标是否在网格内（内部方法）
+
+        越界坐标经扁平编号后会映射到其他格子，因此必须显式拒绝
+
+        参数:
+            state: tuple (x, y) 状态
+            name: str 出错时报告的参数名
+        """
+        x, y = state
+        if not (0 <= x <= self._max_x and 0 <= y <= self._max_y):
+            raise ValueError(f"{name} {state} out of grid {self.env_size}")
+
+    @property
+    def transition_tables(self):
+        """
+        预计算的转移表和奖励表（只读）
+
+        返回:
+            next_table: numpy.ndarray (num_states, num_actions) int32 下一个状态编号
+            reward_table: numpy.ndarray (num_states, num_actions) 奖励
+            target_flat: int 目标状态编号
+        """
+        next_table = self._next.view()
+        next_table.flags.writeable = False
+        reward_table = self._reward.view()
+        reward_table.flags.writeable = False
+        return next_table, reward_table, self._target_flat
+
+    @property
+    def core(self):
+        """
+        本地代码环境核心，首次访问时构造
+
+        返回:
+            GridWorldCore 共享本环境的转移表和奖励表，状态为扁平编号，
+            动作为动作索引；可在 @njit 函数中直接调用 core.step
+        """
+        if self._core is None:
+            start_flat = self.start_state[1] * self._cols + self.start_state[0]
+            self._core = GridWorldCore(self._next, self._reward,
+                                       start_flat, self._target_flat)
+        return self._core
+
+    @property
+    def traj(self):
+        """
+        已记录的轨迹
+
+        返回的是内部轨迹缓冲区的只读视图，与缓冲区共享内存：之后的
+        reset/step 会原地改写其中的数据，缓冲区扩容后视图不再更新。
+        需要保留轨迹时请使用 env.traj.copy()。
+
+        返回:
+            numpy.ndarray (n, 2) 轨迹点 (x, y)
+        """
+        view = self._traj_buf[:self._traj_len]
+        view.flags.writeable = False
+        return view
+
+    def _rand2(self):
+        """
+        从噪声缓冲区取出两个标准正态随机数（内部方法）
         
-        处理边界碰撞、禁止区域、目标到达等情况
+        返回:
+            tuple (float, float)
+        """
+        i = self._noise_i
+        if i + 2 > len(self._noise_buf):
+            self._noise_buf = self._rng.standard_normal(4096)
+            i = 0
+        self._noise_i = i + 2
+        return self._noise_buf[i], self._noise_buf[i + 1]
+
+    def step_many(self, states, actions):
+        """
+        批量执行动作，一次推进 N 个相互独立的智能体
         
         参数:
-            state: tuple (x, y) 当前状态
-            action: tuple (dx, dy) 动作
+            states: numpy.ndarray (N, 2) 当前状态坐标 (x, y)，须在网格范围内
+            actions: numpy.ndarray (N,) 动作索引，可由 encode_action 得到
             
         返回:
-            next_state: tuple (x, y) 下一个状态
-            reward: float 奖励值
+            next_states: numpy.ndarray (N, 2) 下一个状态
+            rewards: numpy.ndarray (N,) 奖励
+            dones: numpy.ndarray (N,) 是否到达终止状态
+            
+        异常:
+            ValueError: 状态坐标越界或动作索引无效
+            
+        示例:
+            >>> states = np.zeros((8, 2), dtype=np.int32)
+            >>> actions = env.encode_action([(1, 0)] * 8)
+            >>> next_states, rewards, dones = env.step_many(states, actions)
         """
-        x, y = state
-        new_state = tuple(np.array(state) + np.array(action))
+        states = np.asarray(states, dtype=np.int32)
+        actions = np.asarray(actions)
+        xs, ys = states[:, 0], states[:, 1]
+        # 越界坐标会经负索引或换行映射到其他状态，必须显式检查
+        if not ((xs >= 0).all() and (xs <= self._max_x).all() and
+                (ys >= 0).all() and (ys <= self._max_y).all()):
+            raise ValueError(f"States out of grid {self.env_size}")
+        if not ((actions >= 0).all() and (actions < len(self.action_space)).all()):
+            raise ValueError(f"Invalid action indices {actions}")
+        s_idx = ys * self._cols + xs
+        next_flat = self._next[s_idx, actions]
+        rewards = self._reward[s_idx, actions]
+        dones = next_flat == self._target_flat
+        next_states = np.stack((next_flat % self._cols, next_flat // self._cols), axis=1)
+        return next_states, rewards, dones
+
+    def encode_action(self, actions):
+        """
+        将动作元组序列转换为动作索引数组
         
-        # 边界检测
-        if y + 1 > self.env_size[1] - 1 and action == (0, 1):    # down
-            y = self.env_size[1] - 1
-            reward = self.reward_forbidden  
-        elif x + 1 > self.env_size[0] - 1 and action == (1, 0):  # right
-            x = self.env_size[0] - 1
-            reward = self.reward_forbidden  
-        elif y - 1 < 0 and action == (0, -1):   # up
-            y = 0
-            reward = self.reward_forbidden  
-        elif x - 1 < 0 and action == (-1, 0):  # left
-            x = 0
-            reward = self.reward_forbidden 
-        elif new_state == self.target_state:  # 到达目标
-            x, y = self.target_state
-            reward = self.reward_target
-        elif new_state in self.forbidden_states:  # 进入禁止区域
-            x, y = state  # 保持在原位
-            reward = self.reward_forbidden        
-        else:
-            x, y = new_state
-            reward = self.reward_step
+        参数:
+            actions: list [(dx, dy), ...] 动作序列
             
-        return (x, y), reward
+        返回:
+            numpy.ndarray (N,) int32 动作索引
+        """
+        return np.fromiter((self._action_index[a] for a in actions),
+                           dtype=np.int32, count=len(actions))
+
+    def _build_transition_tables(self):
+        """
+        预计算所有 (状态, 动作) 对的下一个状态和奖励（内部方法）
         
-    def _is_done(self, state):
+        生成:
+            self._next: numpy.ndarray (num_states, num_actions) 下一个状态编号
+            self._reward: numpy.ndarray (num_states, num_actions) 奖励值
         """
-        检查是否到达终止状态（内部方法）
+        # 转移规则只在 step_kernel 中定义，由 build_tables 遍历所有 (状态, 动作) 对
+        self._next, self._reward = build_tables(
+            np.asarray(self.action_space, dtype=np.int64).reshape(-1, 2),
+            self._max_x, self._max_y, self._tx, self._ty,
+            self._forbidden_mask, self._r_t, self._r_f, self._r_s)
+
+    def _get_next_state_and_reward(self, state, action):
+        """
+        计算下一个状态和奖励（内部方法）
+        
+        处理边界碰撞、禁止区域、目标到达等情况
         
         参数:
-            state: tuple (x, y) 状态
+            state: tuple (x, y) 当前状态
+            action: tuple (dx, dy) 动作
             
         返回:
-            bool: 是否为终止状态
+            next_state: tuple (x, y) 下一个状态
+            reward: float 奖励值
         """
-        return state == self.target_state
-    
+        x, y = state
+        dx, dy = action
+        nx, ny, reward, _ = step_kernel(
+            x, y, dx, dy, self._max_x, self._max_y, self._tx, self._ty,
+            self._forbidden_mask, self._r_t, self._r_f, self._r_s)
+        return (nx, ny), reward
+        
     def render(self, animation_interval=None):
         """
         使用 matplotlib 渲染环境
@@ -211,29 +394,77 @@ class GridWorld():
                 facecolor=self.color_target)
             self.ax.add_patch(self.target_rect)     
 
-            # 绘制禁止区域
-            for forbidden_state in self.forbidden_states:
-                rect = patches.Rectangle(
-                    (forbidden_state[0]-0.5, forbidden_state[1]-0.5), 
-                    1, 1, linewidth=1, edgecolor=self.color_forbid, 
-                    facecolor=self.color_forbid)
-                self.ax.add_patch(rect)
+            # 绘制禁止区域，合并为一个 PatchCollection
+            rects = [patches.Rectangle((fx - 0.5, fy - 0.5), 1, 1)
+                     for fx, fy in self.forbidden_states]
+            self.ax.add_collection(PatchCollection(
+                rects, linewidth=1, edgecolor=self.color_forbid,
+                facecolor=self.color_forbid))
 
             # 初始化智能体和轨迹
             self.agent_star, = self.ax.plot([], [], marker='*', color=self.color_agent, 
                                            markersize=20, linewidth=0.5) 
-            self.traj_obj, = self.ax.plot([], [], color=self.color_trajectory, linewidth=0.5)
+            self._traj_lc = LineCollection([], colors=[self.color_trajectory], linewidths=0.5)
+            self.ax.add_collection(self._traj_lc)
+
+            # GUI 后端使用 blitting：背景只绘制一次，之后每帧只重绘智能体和轨迹
+            # 非交互后端（如 Jupyter inline）通过 savefig 显示，animated 元素
+            # 不会被保存，因此保持完整重绘
+            canvas = self.canvas.canvas
+            self._blit = (canvas.supports_blit and
+                          canvas.required_interactive_framework is not None)
+            self._bg = None
+            if self._blit:
+                self.agent_star.set_animated(True)
+                self._traj_lc.set_animated(True)
+                canvas.mpl_connect('draw_event', self._on_draw)
 
         # 更新智能体位置和轨迹
         self.agent_star.set_data([self.agent_state[0]], [self.agent_state[1]])       
-        traj_x, traj_y = zip(*self.traj)         
-        self.traj_obj.set_data(traj_x, traj_y)
+        # 只把上次渲染之后新增的轨迹点转换为线段
+        traj = self.traj
+        if len(traj) != self._traj_drawn:
+            start = max(self._traj_drawn, 1)
+            self._traj_segments.extend(
+                np.stack((traj[start - 1:-1], traj[start:]), axis=1))
+            self._traj_drawn = len(traj)
+            self._traj_lc.set_segments(list(self._traj_segments))
+
+        canvas = self.canvas.canvas
+        if not self._blit:
+            plt.draw()
+        elif self._bg is None:
+            canvas.draw()  # 完整绘制，触发 _on_draw 保存背景
+        else:
+            canvas.restore_region(self._bg)
+            self._draw_animated()
+            canvas.blit(self.ax.bbox)
+            canvas.flush_events()
 
-        plt.draw()
-        plt.pause(animation_interval)
+        # 无界面后端（Agg）没有事件循环，跳过等待；blitting 时已手动刷新，
+        # 只需运行 GUI 事件循环，无需 plt.pause 的 show/draw_idle 开销
+        if animation_interval > 0 and matplotlib.get_backend().lower() != 'agg':
+            if self._blit:
+                canvas.start_event_loop(animation_interval)
+            else:
+                plt.pause(animation_interval)
         if args.debug:
             input('press Enter to continue...')     
  
+    def _on_draw(self, event):
+        """
+        完整重绘后保存背景并绘制动态元素（内部方法）
+        """
+        self._bg = self.canvas.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        """
+        绘制智能体和轨迹（内部方法）
+        """
+        self.ax.draw_artist(self.agent_star)
+        self.ax.draw_artist(self._traj_lc)
+
     def add_policy(self, policy_matrix):
         """
         在网格上可视化策略
@@ -247,47 +478,61 @@ class GridWorld():
             >>> policy[0, 1] = 1.0  # 状态0总是向右移动
             >>> env.add_policy(policy)
         """
-        for state, state_action_group in enumerate(policy_matrix):    
-            x = state % self.env_size[0]
-            y = state // self.env_size[0]
-            for i, action_probability in enumerate(state_action_group):
-                if action_probability != 0:
-                    dx, dy = self.action_space[i]
-                    if (dx, dy) != (0, 0):
-                        # 绘制动作箭头
-                        self.ax.add_patch(patches.FancyArrow(
-                            x, y, 
-                            dx=(0.1+action_probability/2)*dx, 
-                            dy=(0.1+action_probability/2)*dy, 
-                            color=self.color_policy, 
-                            width=0.001, 
-                            head_width=0.05))
-                    else:
-                        # stay 动作用圆圈表示
-                        self.ax.add_patch(patches.Circle(
-                            (x, y), radius=0.07, 
-                            facecolor=self.color_policy, 
-                            edgecolor=self.color_policy, 
-                            linewidth=1, fill=False))
+        policy_matrix = np.asarray(policy_matrix)
+        states, action_ids = np.nonzero(policy_matrix)
+        probs = policy_matrix[states, action_ids]
+        xs = states % self.env_size[0]
+        ys = states // self.env_size[0]
+        dxy = np.asarray(self.action_space)[action_ids]
+        move = np.any(dxy != 0, axis=1)
+
+        # 所有动作箭头合并为一次 quiver 绘制
+        if move.any():
+            length = 0.1 + probs[move] / 2
+            self.ax.quiver(xs[move], ys[move],
+                           length * dxy[move, 0], length * dxy[move, 1],
+                           color=self.color_policy, angles='xy',
+                           scale_units='xy', scale=1, width=0.003)
+
+        # stay 动作用圆圈表示，合并为一个 PatchCollection
+        stay = ~move
+        if stay.any():
+            circles = [patches.Circle((x, y), radius=0.07)
+                       for x, y in zip(xs[stay], ys[stay])]
+            self.ax.add_collection(PatchCollection(
+                circles, facecolor='none', edgecolor=self.color_policy,
+                linewidth=1))
+        self._bg = None  # 静态内容变化，下次 render 重新保存背景
     
-    def add_state_values(self, values, precision=1):
+    def add_state_values(self, values, precision=1, heatmap=False):
         """
         在网格上显示状态值
         
         参数:
             values: numpy.ndarray 或 list 状态值数组，长度应为 num_states
             precision: int 小数精度
+            heatmap: bool 是否同时用半透明热力图显示状态值
             
         示例:
             >>> values = np.random.randn(25)  # 5x5网格的随机值
             >>> env.add_state_values(values, precision=2)
         """
-        values = np.round(values, precision)
-        for i, value in enumerate(values):
-            x = i % self.env_size[0]
-            y = i // self.env_size[0]
-            self.ax.text(x, y, str(value), ha='center', va='center', 
-                        fontsize=10, color='black')
+        values = np.asarray(values, dtype=float)
+        idx = np.arange(len(values))
+        xs = idx % self.env_size[0]
+        ys = idx // self.env_size[0]
+        labels = np.char.mod(f"%.{precision}f", values)
+
+        if heatmap:
+            self.ax.imshow(values.reshape(self.env_size[1], self.env_size[0]),
+                           alpha=0.3,
+                           extent=(-0.5, self.env_size[0] - 0.5,
+                                   self.env_size[1] - 0.5, -0.5))
+
+        text_kwargs = dict(ha='center', va='center', fontsize=10, color='black')
+        for x, y, label in zip(xs.tolist(), ys.tolist(), labels.tolist()):
+            self.ax.text(x, y, label, **text_kwargs)
+        self._bg = None  # 静态内容变化，下次 render 重新保存背景
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+"""
+GridWorld 的 JAX 函数式实现
+
+环境被表示为无状态函数 step(tables, state, action)，状态为扁平化的
+状态编号 s = y * env_size[0] + x。转移表和奖励表由 GridWorld 预计算后
+上传为 jax.Array，step 只包含两次查表和一次比较，可被 jax.jit 编译，
+并可用 jax.vmap 在批量维度上同时推进成千上万个智能体。
+
+依赖 jax（可选依赖），仅在导入本模块时需要。
+
+Credits: Intelligent Unmanned Systems Laboratory at Westlake University.
+"""
+
+from typing import NamedTuple
+
+import jax
+import jax.numpy as jnp
+
+
+class Tables(NamedTuple):
+    """
+    GridWorld 的静态转移数据（JAX pytree）
+
+    属性:
+        next_state: jax.Array (num_states, num_actions) int32 下一个状态编号
+        reward: jax.Array (num_states, num_actions) float32 奖励
+        target: jax.Array () int32 目标状态编号
+    """
+    next_state: jax.Array
+    reward: jax.Array
+    target: jax.Array
+
+
+def make_tables(env):
+    """
+    由 GridWorld 实例的预计算转移表构造 Tables
+
+    参数:
+        env: GridWorld 环境实例
+
+    返回:
+        Tables
+    """
+    next_table, reward_table, target_flat = env.transition_tables
+    return Tables(next_state=jnp.asarray(next_table, dtype=jnp.int32),
+                  reward=jnp.asarray(reward_table, dtype=jnp.float32),
+                  target=jnp.asarray(target_flat, dtype=jnp.int32))
+
+
+def encode_state(env, state):
+    """
+    将 (x, y) 状态转换为扁平状态编号
+
+    参数:
+        env: GridWorld 环境实例
+        state: tuple (x, y) 状态
+
+    返回:
+        int 状态编号
+    """
+    return state[1] * env.env_size[0] + state[0]
+
+
+@jax.jit
+def step(tables, state, action):
+    """
+    执行一个动作（无分支）
+
+    参数:
+        tables: Tables 转移数据
+        state: int32 状态编号
+        action: int32 动作索引
+
+    返回:
+        next_state: int32 下一个状态编号
+        reward: float32 奖励
+        done: bool 是否到达终止状态
+        info: dict 额外信息（当前为空字典）
+    """
+    next_state = tables.next_state[state, action]
+    reward = tables.reward[state, action]
+    return next_state, reward, next_state == tables.target, {}
+
+
+# 批量版本：tables 共享，state 和 action 沿第 0 维批量化
+batch_step = jax.jit(jax.vmap(step, in_axes=(None, 0, 0)))
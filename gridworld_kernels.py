@@ -0,0 +1,185 @@
+"""
+GridWorld 数值内核
+
+将单步转移逻辑提取为模块级纯函数，安装 numba 时编译为本地代码，
+否则退化为普通 Python 函数，行为一致。
+
+GridWorldCore 把整个环境的查表逻辑封装为 jitclass，可在 @njit 函数中
+直接调用 step，实现完全不经过 Python 解释器的 rollout。
+
+Credits: Intelligent Unmanned Systems Laboratory at Westlake University.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, int32, float64
+    from numba.experimental import jitclass
+
+    # GridWorldCore 的字段类型
+    CORE_SPEC = [
+        ('agent_flat', int32),
+        ('start_flat', int32),
+        ('target_flat', int32),
+        ('next_table', int32[:, :]),
+        ('reward_table', float64[:, :]),
+    ]
+except ImportError:  # numba 为可选依赖
+    CORE_SPEC = None
+
+    def njit(*args, **kwargs):
+        """numba 未安装时的空装饰器"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+    def jitclass(spec):
+        """numba 未安装时的空装饰器"""
+        return lambda cls: cls
+
+
+# 显式签名使内核在导入时即完成编译，避免首次调用时的类型推断延迟；
+# 坐标使用 int64 以直接匹配 Python int，奖励使用 float64 保持与配置一致
+STEP_KERNEL_SIGNATURE = 'Tuple((i8, i8, f8, b1))(i8, i8, i8, i8, i8, i8, i8, i8, b1[:, :], f8, f8, f8)'
+
+
+@njit(STEP_KERNEL_SIGNATURE, cache=True, fastmath=True, boundscheck=False)
+def step_kernel(x, y, dx, dy, max_x, max_y, tx, ty, forb, r_t, r_f, r_s):
+    """
+    单步转移内核
+
+    坐标约定与 GridWorld 一致: x 为列（水平方向，范围 [0, max_x]），
+    y 为行（竖直方向，范围 [0, max_y]），动作 (dx, dy) 直接加到 (x, y) 上。
+
+    参数:
+        x, y: int 当前状态
+        dx, dy: int 动作
+        max_x, max_y: int 坐标上界 (env_size - 1)
+        tx, ty: int 目标状态
+        forb: numpy.ndarray bool 禁止区域掩码，按 [x, y] 索引
+        r_t, r_f, r_s: float 目标 / 禁止区域 / 每步奖励
+
+    返回:
+        nx, ny: int 下一个状态
+        reward: float 奖励值
+        done: bool 是否到达目标
+    """
+    # 无分支边界裁剪：越界分量被截断到网格内，hit 标记是否撞墙
+    cx = x + dx
+    cy = y + dy
+    nx = min(max(cx, 0), max_x)
+    ny = min(max(cy, 0), max_y)
+    hit = (nx != cx) | (ny != cy)
+
+    # 优先级: 撞墙 > 到达目标 > 进入禁止区域 > 普通移动
+    reached = (not hit) & (nx == tx) & (ny == ty)
+    blocked = hit | ((not reached) & forb[nx, ny])
+    reward = r_f if blocked else (r_t if reached else r_s)
+    nx = x if blocked else nx
+    ny = y if blocked else ny
+
+    return nx, ny, reward, nx == tx and ny == ty
+
+
+BUILD_TABLES_SIGNATURE = 'Tuple((i4[:, :], f8[:, :]))(i8[:, :], i8, i8, i8, i8, b1[:, :], f8, f8, f8)'
+
+
+@njit(BUILD_TABLES_SIGNATURE, cache=True, boundscheck=False)
+def build_tables(actions, max_x, max_y, tx, ty, forb, r_t, r_f, r_s):
+    """
+    对所有 (状态, 动作) 对调用 step_kernel，生成转移表和奖励表
+
+    转移规则只在 step_kernel 中定义一次，查表结果与逐步调用完全一致。
+
+    参数:
+        actions: numpy.ndarray (num_actions, 2) int64 动作 (dx, dy)
+        max_x, max_y, tx, ty, forb, r_t, r_f, r_s: 同 step_kernel
+
+    返回:
+        next_table: numpy.ndarray (num_states, num_actions) int32 下一个状态编号，
+                    状态编号 s = y * (max_x + 1) + x
+        reward_table: numpy.ndarray (num_states, num_actions) 奖励
+    """
+    cols = max_x + 1
+    num_states = cols * (max_y + 1)
+    num_actions = actions.shape[0]
+    next_table = np.empty((num_states, num_actions), dtype=np.int32)
+    reward_table = np.empty((num_states, num_actions), dtype=np.float64)
+    for s in range(num_states):
+        x = s % cols
+        y = s // cols
+        for a in range(num_actions):
+            nx, ny, reward, _ = step_kernel(x, y, actions[a, 0], actions[a, 1],
+                                            max_x, max_y, tx, ty, forb,
+                                            r_t, r_f, r_s)
+            next_table[s, a] = ny * cols + nx
+            reward_table[s, a] = reward
+    return next_table, reward_table
+
+
+@jitclass(CORE_SPEC)
+class GridWorldCore:
+    """
+    GridWorld 的本地代码核心
+
+    状态为扁平编号 s = y * env_size[0] + x，step 只做两次查表。
+    通常通过 GridWorld.core 获取，而不是直接构造。
+
+    使用示例：
+        >>> core = env.core
+        >>> core.reset()
+        >>> next_state, reward, done = core.step(1)  # 动作索引
+    """
+
+    def __init__(self, next_table, reward_table, start_flat, target_flat):
+        self.next_table = next_table
+        self.reward_table = reward_table
+        self.start_flat = start_flat
+        self.target_flat = target_flat
+        self.agent_flat = start_flat
+
+    def reset(self):
+        """
+        重置到初始状态，返回状态编号
+        """
+        self.agent_flat = self.start_flat
+        return self.agent_flat
+
+    def step(self, a_idx):
+        """
+        执行动作索引 a_idx，返回 (下一个状态编号, 奖励, 是否完成)
+
+        numba 默认不做越界检查，无效的动作索引在此显式报错
+        """
+        if not 0 <= a_idx < self.next_table.shape[1]:
+            raise ValueError("Invalid action index")
+        s_idx = self.agent_flat
+        self.agent_flat = self.next_table[s_idx, a_idx]
+        return (self.agent_flat, self.reward_table[s_idx, a_idx],
+                self.agent_flat == self.target_flat)
+
+
+@njit
+def rollout(core, actions):
+    """
+    在本地代码中连续执行一串动作，到达终止状态时提前结束
+
+    参数:
+        core: GridWorldCore 环境核心（从当前状态开始）
+        actions: numpy.ndarray (n,) 动作索引
+
+    返回:
+        states: numpy.ndarray (k,) 每步之后的状态编号，k <= n
+        rewards: numpy.ndarray (k,) 每步的奖励
+    """
+    states = np.empty(actions.shape[0], dtype=np.int32)
+    rewards = np.empty(actions.shape[0], dtype=np.float64)
+    k = 0
+    for i in range(actions.shape[0]):
+        state, reward, done = core.step(actions[i])
+        states[i] = state
+        rewards[i] = reward
+        k += 1
+        if done:
+            break
+    return states[:k], rewards[:k]
@@ -7,6 +7,11 @@ import sys
 project_root = Path("./..")
 sys.path.insert(0, str(project_root)) 
 import numpy as np
+import matplotlib
+matplotlib.use("Agg")  # 无界面后端，渲染测试不弹出窗口
+import matplotlib.pyplot as plt
+from matplotlib.collections import PatchCollection
+from matplotlib.quiver import Quiver
 from gridworld import GridWorld
 
 
@@ -130,7 +135,8 @@ def test_trajectory_recording():
         env_size=(3, 3),
         start_state=(0, 0),
         target_state=(2, 2),
-        forbidden_states=[]
+        forbidden_states=[],
+        record_traj=True
     )
     
     state, _ = env.reset()
@@ -143,6 +149,27 @@ def test_trajectory_recording():
     
     print(f"执行3步后轨迹长度: {len(env.traj)}")
     assert len(env.traj) > 1, "轨迹应该被记录"
+    assert not env.traj.flags.writeable, "轨迹视图应为只读"
+    
+    # 默认不记录轨迹
+    env = GridWorld(env_size=(3, 3), start_state=(0, 0), target_state=(2, 2),
+                    forbidden_states=[])
+    env.reset()
+    env.step((1, 0))
+    assert len(env.traj) == 1, "默认不应记录轨迹"
+    
+    # 创建后再开启记录，缓冲区应自动扩容
+    env.record_traj = True
+    for _ in range(3):
+        env.step((0, 1))
+    assert len(env.traj) == 7, "开启记录后轨迹长度错误"
+    assert tuple(env.traj[-1]) == env.agent_state, "轨迹终点错误"
+    
+    env = GridWorld(env_size=(3, 3), start_state=(0, 0), target_state=(2, 2),
+                    forbidden_states=[], record_traj=True, max_traj=0)
+    env.reset()
+    env.step((1, 0))
+    assert len(env.traj) == 3, "max_traj=0 时轨迹长度错误"
     
     print("\n✓ 轨迹记录测试通过！\n")
 
@@ -167,6 +194,291 @@ def test_action_space():
     print("\n✓ 动作空间测试通过！\n")
 
 
+def test_transition_table():
+    """测试预计算转移表"""
+    print("=" * 60)
+    print("测试 7: 预计算转移表")
+    print("=" * 60)
+    
+    env = GridWorld(
+        env_size=(4, 3),
+        start_state=(0, 0),
+        target_state=(3, 2),
+        forbidden_states=[(1, 1)]
+    )
+    
+    next_table, reward_table, _ = env.transition_tables
+    assert next_table.shape == (env.num_states, len(env.action_space)), "转移表形状错误"
+    assert reward_table.shape == (env.num_states, len(env.action_space)), "奖励表形状错误"
+    assert not next_table.flags.writeable, "转移表应为只读"
+    
+    # 查表结果应与逐步计算一致
+    for s in range(env.num_states):
+        state = (s % env.env_size[0], s // env.env_size[0])
+        for a, action in enumerate(env.action_space):
+            next_state, reward = env._get_next_state_and_reward(state, action)
+            next_s = next_state[1] * env.env_size[0] + next_state[0]
+            assert next_table[s, a] == next_s, f"转移表错误: {state}, {action}"
+            assert reward_table[s, a] == reward, f"奖励表错误: {state}, {action}"
+    
+    print("✓ 转移表与逐步计算一致")
+    print("\n✓ 转移表测试通过！\n")
+
+
+def test_step_many():
+    """测试批量执行动作"""
+    print("=" * 60)
+    print("测试 8: 批量执行动作")
+    print("=" * 60)
+    
+    env = GridWorld(
+        env_size=(3, 3),
+        start_state=(0, 0),
+        target_state=(2, 1),
+        forbidden_states=[(1, 0)]
+    )
+    
+    states = np.array([(0, 0), (1, 1), (0, 0), (2, 2)])
+    actions = env.encode_action([(1, 0), (1, 0), (0, -1), (0, 1)])
+    next_states, rewards, dones = env.step_many(states, actions)
+    print(f"批量结果: 状态={next_states.tolist()}, 奖励={rewards.tolist()}, 完成={dones.tolist()}")
+    
+    # 与逐个 step 的结果一致
+    env.reset()
+    for i, state in enumerate(states):
+        env.agent_state = tuple(state)
+        state, reward, done, _ = env.step(env.action_space[actions[i]])
+        assert tuple(next_states[i]) == state, "批量状态与单步不一致"
+        assert rewards[i] == reward, "批量奖励与单步不一致"
+        assert dones[i] == done, "批量完成标记与单步不一致"
+    
+    # 越界坐标应报错，而不是映射到其他状态
+    for bad_state in [(-1, 0), (3, 0), (0, 3)]:
+        try:
+            env.step_many(np.array([bad_state]), np.array([0]))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"越界状态 {bad_state} 应报错")
+    
+    print("\n✓ 批量执行测试通过！\n")
+
+
+def test_jax_step():
+    """测试 JAX 函数式 step"""
+    print("=" * 60)
+    print("测试 9: JAX 函数式 step")
+    print("=" * 60)
+    
+    try:
+        import gridworld_jax
+    except ImportError:
+        print("未安装 jax，跳过")
+        return
+    
+    env = GridWorld(
+        env_size=(4, 3),
+        start_state=(0, 0),
+        target_state=(3, 2),
+        forbidden_states=[(1, 1)]
+    )
+    tables = gridworld_jax.make_tables(env)
+    
+    # 批量 step 与逐个 step 的结果一致
+    states = [(s % 4, s // 4) for s in range(env.num_states)]
+    for a, action in enumerate(env.action_space):
+        flat = np.array([gridworld_jax.encode_state(env, st) for st in states])
+        next_flat, rewards, dones, _ = gridworld_jax.batch_step(
+            tables, flat, np.full(len(flat), a))
+        for i, state in enumerate(states):
+            env.reset()
+            env.agent_state = state
+            next_state, reward, done, _ = env.step(action)
+            assert int(next_flat[i]) == gridworld_jax.encode_state(env, next_state), "JAX 状态不一致"
+            assert np.isclose(rewards[i], reward), "JAX 奖励不一致"
+            assert bool(dones[i]) == done, "JAX 完成标记不一致"
+    
+    print("✓ JAX step 与 GridWorld.step 一致")
+    print("\n✓ JAX step 测试通过！\n")
+
+
+def test_bellman_backup():
+    """测试贝尔曼最优备份"""
+    print("=" * 60)
+    print("测试 10: 贝尔曼最优备份")
+    print("=" * 60)
+    
+    from gridworld_bellman import bellman_backup
+    
+    env = GridWorld()
+    gamma = 0.9
+    V = np.random.randn(env.num_states)
+    
+    # 逐状态、逐动作计算作为参照
+    expected = np.empty(env.num_states)
+    for s in range(env.num_states):
+        state = (s % env.env_size[0], s // env.env_size[0])
+        q_values = []
+        for action in env.action_space:
+            (nx, ny), reward = env._get_next_state_and_reward(state, action)
+            q_values.append(reward + gamma * V[ny * env.env_size[0] + nx])
+        expected[s] = max(q_values)
+    
+    next_table, reward_table, _ = env.transition_tables
+    result = bellman_backup(V, next_table, reward_table, gamma)
+    assert np.allclose(result, expected), "贝尔曼备份结果错误"
+    
+    # int64 转移表与 int32 结果一致
+    result = bellman_backup(V, next_table.astype(np.int64), reward_table, gamma)
+    assert np.allclose(result, expected), "int64 转移表结果错误"
+    
+    print("✓ 贝尔曼备份与逐状态计算一致")
+    print("\n✓ 贝尔曼备份测试通过！\n")
+
+
+def test_non_square_grid():
+    """测试非方形网格的坐标约定"""
+    print("=" * 60)
+    print("测试 11: 非方形网格")
+    print("=" * 60)
+    
+    # env_size = (width, height): x 方向 4 列, y 方向 2 行
+    env = GridWorld(
+        env_size=(4, 2),
+        start_state=(3, 0),
+        target_state=(0, 1),
+        forbidden_states=[]
+    )
+    
+    state, _ = env.reset()
+    state, reward, done, _ = env.step((1, 0))  # 右侧边界
+    assert state == (3, 0) and reward < 0, "右侧边界处理错误"
+    state, reward, done, _ = env.step((0, 1))  # 向下进入最后一行
+    assert state == (3, 1) and reward < 0 and not done, "向下移动错误"
+    state, reward, done, _ = env.step((0, 1))  # 下侧边界
+    assert state == (3, 1) and reward < 0, "下侧边界处理错误"
+    
+    # 越界的起点、目标和直接赋值的状态应报错
+    for kwargs in [dict(start_state=(4, 0)), dict(target_state=(0, 2)),
+                   dict(target_state=(-1, 0)), dict(forbidden_states=[(-1, 0)]),
+                   dict(forbidden_states=[(4, 1)])]:
+        try:
+            GridWorld(**dict(dict(env_size=(4, 2), start_state=(0, 0),
+                                  target_state=(3, 1), forbidden_states=[]), **kwargs))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"越界参数 {kwargs} 应报错")
+    try:
+        env.agent_state = (4, 0)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("越界的 agent_state 应报错")
+    
+    # 非单位动作越界时同样保持在原位
+    state, reward = env._get_next_state_and_reward((3, 1), (1, 1))
+    assert state == (3, 1) and reward < 0, "越界动作处理错误"
+    
+    print("\n✓ 非方形网格测试通过！\n")
+
+
+def test_core_rollout():
+    """测试本地代码环境核心"""
+    print("=" * 60)
+    print("测试 12: 本地代码环境核心")
+    print("=" * 60)
+    
+    from gridworld_kernels import rollout
+    
+    env = GridWorld()
+    # 经过一次撞墙后到达目标，最后的动作应被提前结束截断
+    actions = [(0, -1), (1, 0), (1, 0), (1, 0), (1, 0), (0, 1), (0, 1), (0, 1), (0, 1), (0, 0)]
+    
+    env.reset()
+    expected = []
+    for action in actions:
+        state, reward, done, _ = env.step(action)
+        expected.append((state[1] * env.env_size[0] + state[0], reward))
+        if done:
+            break
+    
+    core = env.core
+    assert core.reset() == env.start_state[1] * env.env_size[0] + env.start_state[0], "核心初始状态错误"
+    states, rewards = rollout(core, env.encode_action(actions))
+    print(f"rollout 状态: {states.tolist()}")
+    assert states.tolist() == [s for s, _ in expected], "核心状态与 GridWorld.step 不一致"
+    assert np.allclose(rewards, [r for _, r in expected]), "核心奖励与 GridWorld.step 不一致"
+    
+    # 无效的动作索引应报错，而不是读取越界内存
+    for bad_action in [-1, len(env.action_space)]:
+        try:
+            core.step(bad_action)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"无效动作索引 {bad_action} 应报错")
+    
+    print("\n✓ 环境核心测试通过！\n")
+
+
+def test_render_smoke():
+    """测试渲染、策略和状态值可视化"""
+    print("=" * 60)
+    print("测试 13: 渲染冒烟测试")
+    print("=" * 60)
+    
+    # 非方形网格: x 方向 4 列, y 方向 2 行
+    env = GridWorld(
+        env_size=(4, 2),
+        start_state=(0, 0),
+        target_state=(3, 1),
+        forbidden_states=[(1, 1)],
+        record_traj=True
+    )
+    
+    # 轨迹渲染，reset 后线段清空
+    env.reset()
+    env.render(animation_interval=0)
+    for action in [(1, 0), (1, 0), (0, 1)]:
+        env.step(action)
+        env.render(animation_interval=0)
+    assert len(env._traj_segments) == 6, "轨迹线段数错误"
+    assert len(env._traj_lc.get_segments()) == 6, "LineCollection 线段数错误"
+    env.reset()
+    env.render(animation_interval=0)
+    assert len(env._traj_segments) == 0, "reset 后轨迹线段应被清空"
+    assert len(env._traj_lc.get_segments()) == 0, "reset 后 LineCollection 应被清空"
+    
+    # 策略: 同时包含移动和停留
+    policy = np.zeros((env.num_states, len(env.action_space)))
+    policy[:, 1] = 0.5   # right
+    policy[:, 4] = 0.5   # stay
+    policy[0, 2] = 1.0   # down
+    env.add_policy(policy)
+    quivers = [c for c in env.ax.collections if isinstance(c, Quiver)]
+    assert len(quivers) == 1 and quivers[0].N == env.num_states + 1, "策略箭头数量错误"
+    circles = [c for c in env.ax.collections
+               if isinstance(c, PatchCollection) and len(c.get_paths()) == env.num_states]
+    assert len(circles) == 1, "停留圆圈数量错误"
+    
+    # 状态值热力图: 图像为 (行数, 列数)，每格值与状态编号对应
+    values = np.arange(env.num_states, dtype=float)
+    env.add_state_values(values, precision=1, heatmap=True)
+    image = env.ax.images[-1]
+    assert image.get_array().shape == (2, 4), "热力图形状错误"
+    assert tuple(image.get_extent()) == (-0.5, 3.5, 1.5, -0.5), "热力图范围错误"
+    for s, value in enumerate(values):
+        x, y = s % 4, s // 4
+        assert image.get_array()[y, x] == value, "热力图方向错误"
+    labels = {(t.get_position(), t.get_text()) for t in env.ax.texts}
+    assert ((3, 1), "7.0") in labels, "状态值标签位置错误"
+    env.render(animation_interval=0)
+    plt.close(env.canvas)
+    
+    print("\n✓ 渲染冒烟测试通过！\n")
+
+
 def run_all_tests():
     """运行所有测试"""
     print("\n" + "=" * 60)
@@ -179,7 +491,14 @@ def run_all_tests():
         test_forbidden_states,
         test_target_reaching,
         test_trajectory_recording,
-        test_action_space
+        test_action_space,
+        test_transition_table,
+        test_step_many,
+        test_jax_step,
+        test_bellman_backup,
+        test_non_square_grid,
+        test_core_rollout,
+        test_render_smoke
     ]
     
     passed = 0